@@ -15,7 +15,11 @@ caas/sfdcarticles/sfdcarticles/How-to-export-fiber-orientation-results
 
 """
 
+import functools
+import io
+import itertools
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy
 
@@ -31,6 +35,28 @@ pat_to_meshio_type = {
     9: "pyramid",
 }
 meshio_to_pat_type = {v: k for k, v in pat_to_meshio_type.items()}
+pat_num_nodes = {2: 2, 3: 3, 4: 4, 5: 4, 7: 6, 8: 8, 9: 5}
+# Higher-order cells whose nodes fit on the single 10I8 LNODES line
+pat_to_meshio_higher_order_type = {
+    (2, 3): "line3",
+    (3, 6): "triangle6",
+    (4, 8): "quad8",
+    (4, 9): "quad9",
+    (5, 10): "tetra10",
+}
+
+# Number of cards converted to numbers at once
+_chunk_size = 65536
+
+# Read buffer of *.pat files in bytes
+_buffer_size = 65536
+
+# All node and element IDs are stored with the same dtype so that the
+# searchsorted lookups never have to cast the sorted IDs.
+_gid_dtype = numpy.int64
+
+# First fields of a card header line
+_header_dtype = numpy.dtype([("IT", "S2"), ("ID", "S8"), ("IV", "S8")])
 
 
 def read(
@@ -66,31 +92,51 @@ def read(
 
         autoremove : boolean
             automatically delete cells with no data attached
+
+    The geometry of the most recently read *.pat file is kept in memory and
+    reused as long as the file is unchanged; the data files are added to a
+    fresh copy of it. Call ``meshio.patran_io.clear_cache()`` to release it.
     """
-    with open(filename, "r") as f:
-        mesh, element_gids, point_gids = read_pat_buffer(f, scale)
+    stat = os.stat(filename)
+    template, element_gids, point_gids = _read_pat_file(
+        os.path.abspath(filename),
+        (stat.st_mtime_ns, stat.st_size, stat.st_ino),
+        scale,
+    )
+    mesh = Mesh(
+        template.points.copy(),
+        {key: value.copy() for key, value in template.cells.items()},
+    )
 
-    # if *.ele file is present: Add cell data
+    # Collect the data files that are present. Element data is added first,
+    # then XML data and finally node data. The flag tells whether the file
+    # replaces the point data instead of adding to it.
+    jobs = []
     for ele_filename in ele_filenames:
         ele_filename = ele_filename or filename.replace(".pat", ".ele")
         if os.path.isfile(ele_filename):
-            with open(ele_filename, "r") as f:
-                mesh = read_ele_buffer(f, mesh, element_gids)
-
-    # if *.xml file is present: Add cell or node data
+            jobs.append((_read_ele_file, ele_filename, False))
     for xml_filename in xml_filenames:
         xml_filename = xml_filename or filename.replace(".pat", ".xml")
         if os.path.isfile(xml_filename):
-            mesh = read_xml_buffer(
-                xml_filename, mesh, element_gids, point_gids
-            )
-
-    # if *.nod file is present: Add point data
+            jobs.append((_read_xml_file, xml_filename, False))
     for nod_filename in nod_filenames:
         nod_filename = nod_filename or filename.replace(".pat", ".nod")
         if os.path.isfile(nod_filename):
-            with open(nod_filename, "r") as f:
-                mesh = read_nod_buffer(f, mesh, point_gids)
+            jobs.append((_read_nod_file, nod_filename, True))
+
+    # The data files are independent of each other. They are parsed
+    # concurrently into separate overlays, which are merged in order. On a
+    # single core the threads only add contention, so one worker is used.
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+        futures = [
+            executor.submit(
+                read_file, data_filename, mesh, element_gids, point_gids
+            )
+            for read_file, data_filename, _ in jobs
+        ]
+        for (_, _, replace_point_data), future in zip(jobs, futures):
+            _merge_data(mesh, future.result(), replace_point_data)
 
     if autoremove:
         mesh.prune()
@@ -99,6 +145,54 @@ def read(
     return mesh
 
 
+@functools.lru_cache(maxsize=1)
+def _read_pat_file(filename, stat_key, scale):
+    """Read a Patran geometry file.
+
+    The result is cached; stat_key holds the modification time, size and
+    inode of the file so that it is read again after it changed.
+    """
+    # Lines are taken one by one; a larger buffer means fewer raw reads.
+    with open(filename, "rb", buffering=_buffer_size) as f:
+        return read_pat_buffer(f, scale)
+
+
+def clear_cache():
+    """Release the cached geometry of the last *.pat file read."""
+    _read_pat_file.cache_clear()
+
+
+def _read_ele_file(ele_filename, mesh, element_gids, point_gids):
+    """Read an element based data file into a new mesh sharing the cells."""
+    with open(ele_filename, "r") as f:
+        return read_ele_buffer(f, Mesh(mesh.points, mesh.cells), element_gids)
+
+
+def _read_xml_file(xml_filename, mesh, element_gids, point_gids):
+    """Read an XML data file into a new mesh sharing the cells."""
+    return read_xml_buffer(
+        xml_filename, Mesh(mesh.points, mesh.cells), element_gids, point_gids
+    )
+
+
+def _read_nod_file(nod_filename, mesh, element_gids, point_gids):
+    """Read a node based data file into a new mesh sharing the cells."""
+    with open(nod_filename, "r") as f:
+        return read_nod_buffer(f, Mesh(mesh.points, mesh.cells), point_gids)
+
+
+def _merge_data(mesh, overlay, replace_point_data):
+    """Add the data fields read into overlay to mesh."""
+    for elem_type, data in overlay.cell_data.items():
+        if elem_type not in mesh.cell_data.keys():
+            mesh.cell_data[elem_type] = {}
+        mesh.cell_data[elem_type].update(data)
+    if replace_point_data:
+        mesh.point_data = overlay.point_data
+    else:
+        mesh.point_data.update(overlay.point_data)
+
+
 def read_ele_buffer(f, mesh, element_gids):
     """Read element based data file."""
 
@@ -108,176 +202,307 @@ def read_ele_buffer(f, mesh, element_gids):
     order = int(dimensions[-1])
     f.readline()
 
-    data = {}
+    ids, values = _read_data(f, N, order)
+    _add_cell_data(mesh, _cell_index(mesh, element_gids), name, ids, values)
+    return mesh
+
 
-    for i in range(N):
-        line = f.readline().split()
-        ID = int(line[0])
-        values = list(map(float, line[1:]))
-        data[ID] = numpy.array(values)
+def read_xml_buffer(xml_filename, mesh, element_gids, point_gids):
+    """Read element based data file.
 
-    for elem_type in mesh.cells.keys():
-        if elem_type not in mesh.cell_data.keys():
-            mesh.cell_data[elem_type] = {}
-        for pos, gid in enumerate(element_gids[elem_type]):
-            try:
-                values = data[gid]
-            except KeyError:
-                values = numpy.nan * numpy.ones(order)
-            if name in mesh.cell_data[elem_type].keys():
-                mesh.cell_data[elem_type][name].append(values)
-            else:
-                mesh.cell_data[elem_type][name] = [values]
+    The file is parsed as a stream and every block is discarded once its data
+    is attached to the mesh, so the document is never held in memory as a
+    whole.
+    """
+    import xml.etree.ElementTree as ET
+
+    # The ID lookups are the same for all blocks.
+    cell_index = _cell_index(mesh, element_gids)
+    point_index = (point_gids, numpy.argsort(point_gids))
+
+    in_block = False
+    for event, elem in ET.iterparse(xml_filename, events=("start", "end")):
+        if elem.tag == "Block":
+            in_block = event == "start"
+        if event != "end" or in_block:
+            # the contents of a block are read together with the block
+            continue
+
+        if elem.tag == "DataType":
+            type = elem.text
+        elif elem.tag == "NumberOfComponents":
+            order = int(elem.text)
+        elif elem.tag == "DeptVar":
+            base_name = elem.get("Name").replace(" ", "_").rstrip("\n")
+        elif elem.tag == "Block":
+            _read_xml_block(
+                elem, mesh, cell_index, point_index, type, order, base_name
+            )
+            elem.clear()
 
     return mesh
 
 
-def read_xml_buffer(xml_filename, mesh, element_gids, point_gids):
-    """Read element based data file."""
-    import xml.etree.ElementTree as ET
+def _read_xml_block(
+    block, mesh, cell_index, point_index, type, order, base_name
+):
+    """Attach the data of one XML block to the mesh."""
+    indep = block.find("IndpVar")
+    if indep is not None:
+        indep_idx = block.get("Index")
+        indep_name = indep.get("Name")
+        indep_value = indep.get("Value")
+        indep_unit = indep.get("Unit")
+        name = "%s_Block:%s_%s:%s%s" % (
+            base_name,
+            indep_idx,
+            indep_name,
+            indep_value,
+            indep_unit,
+        )
+    else:
+        name = base_name
+
+    ids = []
+    lines = []
+    layers = block.findall("Layer") or [block]
+    for layer in layers:
+        for item in layer.find("Data"):
+            ids.append(item.get("ID"))
+            lines.append(item.find("DeptValues").text)
+
+    ids = numpy.array(ids, dtype=_gid_dtype)
+    values = numpy.fromstring(" ".join(lines), sep=" ")
+    values = values.reshape(len(ids), order)
+
+    # Data of later layers overrides data of earlier ones for the same ID.
+    ids, last = numpy.unique(ids[::-1], return_index=True)
+    values = values[::-1][last]
+
+    if "ELDT" in type:
+        _add_cell_data(mesh, cell_index, name, ids, values)
+
+    elif "NDDT" in type:
+        point_gids, point_order = point_index
+        point_values = numpy.full((len(point_gids), order), numpy.nan)
+        rows, found = _lookup(point_gids, ids, point_order)
+        point_values[rows[found]] = values[found]
+        mesh.point_data[name] = numpy.squeeze(point_values)
+
+
+def _lookup(gids, ids, order=None):
+    """Find the positions of ids in gids.
+
+    Returns the positions and a mask marking the ids that occur in gids.
+    Positions of ids that do not occur are meaningless. If gids is searched
+    repeatedly, its argsort can be passed as order.
+    """
+    gids = numpy.asarray(gids)
+    if len(gids) == 0:
+        return numpy.zeros(len(ids), dtype=int), numpy.zeros(len(ids), bool)
+    if order is None:
+        order = numpy.argsort(gids)
+    idx = numpy.searchsorted(gids, ids, sorter=order)
+    idx = order[numpy.minimum(idx, len(gids) - 1)]
+    return idx, gids[idx] == ids
 
-    tree = ET.parse(xml_filename)
-    root = tree.getroot()
 
-    dataset = root.find("Dataset")
-    type = dataset.find("DataType").text
-    order = int(dataset.find("NumberOfComponents").text)
-    base_name = (
-        dataset.find("DeptVar").get("Name").replace(" ", "_").rstrip("\n")
+def _read_data(f, N, order):
+    """Read N lines of an ID followed by order values.
+
+    Returns the IDs and a (N, order) array of values. Blank lines are
+    skipped; if there is no data, empty arrays are returned.
+    """
+    rows = [line for line in itertools.islice(f, N) if line.strip()]
+    if not rows:
+        return numpy.empty(0, dtype=_gid_dtype), numpy.empty((0, order))
+    table = numpy.loadtxt(rows, ndmin=2)
+    if table.shape[1] != order + 1:
+        raise ValueError(
+            "The header gives {} components per ID, but the data rows "
+            "hold {}.".format(order, table.shape[1] - 1)
+        )
+    return table[:, 0].astype(_gid_dtype), table[:, 1:]
+
+
+def _cell_index(mesh, element_gids):
+    """Concatenate the element IDs of all cell types in mesh order.
+
+    Returns the IDs and their argsort for use with _lookup.
+    """
+    cell_gids = numpy.concatenate(
+        [numpy.asarray(element_gids[t], dtype=_gid_dtype) for t in mesh.cells]
+        + [numpy.empty(0, dtype=_gid_dtype)]
     )
-    blocks = dataset.find("Blocks")
-
-    for block in blocks.findall("Block"):
-        data = {}
-        indep = block.find("IndpVar")
-        if indep is not None:
-            indep_idx = block.get("Index")
-            indep_name = indep.get("Name")
-            indep_value = indep.get("Value")
-            indep_unit = indep.get("Unit")
-            name = "%s_Block:%s_%s:%s%s" % (
-                base_name,
-                indep_idx,
-                indep_name,
-                indep_value,
-                indep_unit,
-            )
-        else:
-            name = base_name
-
-        layers = block.findall("Layer") or [block]
-        for layer in layers:
-            for item in layer.find("Data"):
-                ID = int(item.get("ID"))
-                line = item.find("DeptValues").text
-                values = list(map(float, line.split()))
-                data[ID] = numpy.array(values)
-
-        if "ELDT" in type:
-            for elem_type in mesh.cells.keys():
-                if elem_type not in mesh.cell_data.keys():
-                    mesh.cell_data[elem_type] = {}
-                for pos, gid in enumerate(element_gids[elem_type]):
-                    try:
-                        values = data[gid]
-                    except KeyError:
-                        values = numpy.nan * numpy.ones(order)
-
-                    if name in mesh.cell_data[elem_type].keys():
-                        mesh.cell_data[elem_type][name].append(values)
-                    else:
-                        mesh.cell_data[elem_type][name] = [values]
-
-        elif "NDDT" in type:
-            for gid in point_gids:
-                try:
-                    values = data[gid]
-                except KeyError:
-                    values = numpy.nan * numpy.ones(order)
-
-                if name in mesh.point_data.keys():
-                    mesh.point_data[name] = numpy.vstack(
-                        (mesh.point_data[name], values)
-                    )
-                else:
-                    mesh.point_data[name] = values
-            mesh.point_data[name] = numpy.squeeze(mesh.point_data[name])
+    return cell_gids, numpy.argsort(cell_gids)
 
-    return mesh
+
+def _add_cell_data(mesh, cell_index, name, ids, values):
+    """Attach element data to the cells of the mesh.
+
+    Cells without an entry in ids are filled with NaN.
+    """
+    cell_gids, cell_order = cell_index
+    rows, found = _lookup(cell_gids, ids, cell_order)
+    cell_values = numpy.full((len(cell_gids), values.shape[1]), numpy.nan)
+    cell_values[rows[found]] = values[found]
+
+    start = 0
+    for elem_type in mesh.cells.keys():
+        end = start + len(mesh.cells[elem_type])
+        if elem_type not in mesh.cell_data.keys():
+            mesh.cell_data[elem_type] = {}
+        mesh.cell_data[elem_type][name] = cell_values[start:end]
+        start = end
 
 
 def read_nod_buffer(f, mesh, point_gids):
     """Read node based data file."""
-    node_id_map = {}
-    for line, id in enumerate(point_gids):
-        node_id_map[id] = line
-
     name = f.readline().replace(" ", "_").rstrip("\n")
     dimensions = f.readline().split()
     N = len(point_gids)
     order = int(dimensions[-1])
     f.readline()
 
-    array = numpy.nan * numpy.ones([N, order])
+    array = numpy.full((N, order), numpy.nan)
 
-    for i in range(N):
-        line = f.readline()
-        if line:
-            line = line.split()
-            ID = int(line[0])
-            values = list(map(float, line[1:]))
-            line = node_id_map[ID]
-            array[line, :] = values
+    ids, values = _read_data(f, N, order)
+    rows, found = _lookup(point_gids, ids)
+    array[rows[found], :] = values[found]
 
     mesh.point_data = {name: numpy.squeeze(array)}
     return mesh
 
 
 def read_pat_buffer(f, scale):
-    """Read Patran geometry file."""
+    """Read Patran geometry file.
+
+    The buffer is walked card by card. Node and element cards are collected
+    in chunks of _chunk_size cards, and each chunk is converted to arrays in
+    bulk, so only one chunk of raw lines is held in memory at a time.
+    Patran files are ASCII, so the lines are processed as bytes. Buffers
+    opened in binary mode are never decoded; lines of text buffers are
+    encoded to ASCII first.
+    """
     # Initialize the optional data fields
-    cells = {}
-    points = []
+    node_headers = []
+    node_lines = []
+    cell_headers = []
+    cell_counts = []
+    cell_lines = []
+
     point_gids = []
+    points = []
     element_gids = {}
+    cells = {}
 
-    while True:
-        line = f.readline()
-        if not line:
-            # EOF
-            break
-
-        card_data = line.split()
-        if line.startswith(" 1"):
-            points.append(_read_node(f, scale))
-            point_gids.append(int(card_data[1]))
-        elif line.startswith(" 2"):
-            lnodes = _read_cell(f)
-            shape_code = int(card_data[2])
-            key = pat_to_meshio_type[shape_code]
-            if key in cells:
-                cells[key].append(lnodes)
-                element_gids[key].append(int(card_data[1]))
+    def convert_nodes():
+        gids, _ = _read_headers(node_headers)
+        point_gids.append(gids)
+        points.append(_read_nodes(node_lines, scale))
+        del node_headers[:], node_lines[:]
+
+    def convert_cells():
+        # Group the cells by shape code and node count in order of
+        # appearance.
+        gids, shape_codes = _read_headers(cell_headers)
+        counts = _read_num_nodes(cell_counts)
+        lines = numpy.array(cell_lines, dtype=object)
+        pairs, first, inverse = numpy.unique(
+            numpy.column_stack([shape_codes, counts]),
+            axis=0,
+            return_index=True,
+            return_inverse=True,
+        )
+        inverse = inverse.reshape(-1)
+        for k in numpy.argsort(first):
+            shape_code, num_nodes = pairs[k]
+            idx = numpy.flatnonzero(inverse == k)
+            if num_nodes == pat_num_nodes[shape_code]:
+                key = pat_to_meshio_type[shape_code]
+            elif (shape_code, num_nodes) in pat_to_meshio_higher_order_type:
+                key = pat_to_meshio_higher_order_type[shape_code, num_nodes]
             else:
-                cells[key] = [lnodes]
-                element_gids[key] = [int(card_data[1])]
-        elif line.startswith(" 4"):
+                raise ValueError(
+                    "Element {} with shape code {} has {} nodes, "
+                    "which is not a supported cell type.".format(
+                        gids[idx[0]], shape_code, num_nodes
+                    )
+                )
+            lnodes = _read_cells(lines[idx], num_nodes)
+            element_gids.setdefault(key, []).append(gids[idx])
+            cells.setdefault(key, []).append(lnodes)
+        del cell_headers[:], cell_counts[:], cell_lines[:]
+
+    lines = iter(f)
+    if isinstance(f, io.TextIOBase):
+        lines = (line.encode("ascii", "replace") for line in lines)
+    for line in lines:
+        if line.startswith(b" 1"):
+            node_headers.append(line)
+            node_lines.append(next(lines, b""))
+            next(lines, None)
+            if len(node_headers) == _chunk_size:
+                convert_nodes()
+        elif line.startswith(b" 2"):
+            cell_headers.append(line)
+            cell_counts.append(next(lines, b""))
+            cell_lines.append(next(lines, b""))
+            if len(cell_headers) == _chunk_size:
+                convert_cells()
+        elif line.startswith(b" 4"):
             # do not read cross section properties.
-            f.readline()
-
-    for key in cells.keys():
-        cells[key] = numpy.vstack(cells[key])
-
-    points = numpy.array(points, dtype=float)
-    point_gids = numpy.array(point_gids, dtype=int)
+            next(lines, None)
+    convert_nodes()
+    convert_cells()
+
+    # The counts are unknown until the walk ends, and a counting prepass
+    # costs a second walk over the file. Joining the converted chunks
+    # only copies the final arrays once.
+    point_gids = numpy.concatenate(point_gids)
+    points = numpy.concatenate(points)
+    for key in cells:
+        element_gids[key] = numpy.concatenate(element_gids[key])
+        cells[key] = numpy.concatenate(cells[key])
 
     cells = _scan_cells(point_gids, cells)
 
     return Mesh(points, cells), element_gids, point_gids
 
 
-def _read_node(f, scale):
-    """Read a node card.
+def _read_headers(lines):
+    """Read the ID and IV fields of card header lines.
+
+    The header card has the fixed format (I2, 8I8):
+    == == == == == == == == ==
+    IT ID IV KC N1 N2 N3 N4 N5
+    == == == == == == == == ==
+
+    For node cards, IV is unused. For element cards, IV is the shape code.
+    Chunks with headers that do not fill the fixed columns, e.g. a node
+    header ending after the ID, are split at whitespace instead; a missing
+    IV is read as 0.
+    """
+    fields = numpy.array(lines, dtype="S18").view(_header_dtype)
+    try:
+        return fields["ID"].astype(_gid_dtype), fields["IV"].astype(int)
+    except ValueError:
+        card_data = [line.split() + [b"0"] for line in lines]
+        ids = numpy.array([data[1] for data in card_data], dtype=_gid_dtype)
+        ivs = numpy.array([data[2] for data in card_data], dtype=int)
+        return ids, ivs
+
+
+def _read_num_nodes(lines):
+    """Read the NODES field from the second line of element cards."""
+    try:
+        return numpy.array(lines, dtype="S8").astype(int)
+    except ValueError:
+        return numpy.array([line.split()[0] for line in lines], dtype=int)
+
+
+def _read_nodes(lines, scale):
+    """Read the coordinates of node cards.
 
     The node card contains the following:
     === ===== === ====== === ===
@@ -286,16 +511,17 @@ def _read_node(f, scale):
     X   Y     Z
     ICF GTYPE NDF CONFIG CID PSP
     === ===== === ====== === ===
+
+    The coordinates are stored in fixed columns of 16 characters.
     """
-    line = f.readline()
-    entries = [line[i : i + 16] for i in range(0, len(line), 16)]
-    point = [scale * float(coordinate) for coordinate in entries[:-1]]
-    f.readline()
-    return point
+    entries = numpy.array(lines, dtype="S48").view("S16").reshape(-1, 3)
+    points = entries.astype(float)
+    points *= scale
+    return points
 
 
-def _read_cell(f):
-    """Read a cell card.
+def _read_cells(lines, num_nodes):
+    """Read the node lists of cell cards of one type.
 
     The element card contains the following:
     ====== ====== === ==== == == ==
@@ -305,19 +531,34 @@ def _read_cell(f):
     LNODES
     ADATA
     ====== ====== === ==== == == ==
+
+    LNODES holds the node IDs in fixed columns of 8 characters and may be
+    padded with zeros. Only the first num_nodes columns are read. Chunks with
+    lines that do not follow the fixed columns are split at whitespace
+    instead.
     """
-    f.readline()
-    entries = f.readline().split()
-    lnodes = list(map(int, entries))
-    lnodes = numpy.trim_zeros(lnodes)
-    return numpy.array(lnodes)
+    try:
+        entries = numpy.array(lines, dtype="S%d" % (8 * num_nodes)).view("S8")
+        return entries.reshape(-1, num_nodes).astype(_gid_dtype)
+    except ValueError:
+        return numpy.array(
+            [line.split()[:num_nodes] for line in lines], dtype=_gid_dtype
+        )
 
 
 def _scan_cells(point_gids, cells):
-    lookup_table = dict(zip(point_gids, numpy.arange(0, len(point_gids))))
+    """Replace the node IDs in the cells by the position of the node."""
+    order = numpy.argsort(point_gids)
     for elem_type in cells.keys():
-        vect_lookup = numpy.vectorize(lookup_table.get)
-        cells[elem_type] = vect_lookup(cells[elem_type])
+        idx, found = _lookup(point_gids, cells[elem_type], order)
+        if not found.all():
+            missing = numpy.unique(cells[elem_type][~found])
+            raise ValueError(
+                "Cells of type {} refer to undefined node IDs: {}".format(
+                    elem_type, ", ".join(str(gid) for gid in missing)
+                )
+            )
+        cells[elem_type] = idx
     return cells
 
 
@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+#
+import os
+import warnings
+
+import numpy
+import pytest
+
+import meshio
+
+# Node IDs are deliberately unsorted and non-contiguous to exercise the ID
+# remapping; negative coordinates fill the full 16-character columns.
+points = numpy.array(
+    [
+        [0.0, 0.0, 0.0],
+        [-1.0, 0.0, 0.0],
+        [-1.0, -1.0, 0.0],
+        [0.0, -1.0, 0.0],
+        [-2.0, 0.0, 0.0],
+        [-2.0, -1.0, 0.0],
+    ]
+)
+point_gids = [30, 10, 20, 50, 40, 60]
+cells = {
+    "quad": (numpy.array([[30, 10, 20, 50]]), [7]),
+    "triangle": (numpy.array([[10, 40, 60], [10, 60, 20]]), [3, 5]),
+}
+
+
+def _write_pat(filename, points, point_gids, cells):
+    with open(filename, "w") as f:
+        f.write("25       0       0       1       0       0       0       0\n")
+        f.write("Patran test file\n")
+        for gid, point in zip(point_gids, points):
+            f.write(
+                " 1{:8d}       0       2       0       0       0\n".format(gid)
+            )
+            f.write("".join("{:16.9E}".format(x) for x in point) + "\n")
+            f.write("1G       6       0       0  000000\n")
+        for key, (lnodes, gids) in cells.items():
+            shape_code = meshio.patran_io.meshio_to_pat_type[key]
+            for gid, nodes in zip(gids, lnodes):
+                f.write(
+                    " 2{:8d}{:8d}       2       0       0       0\n".format(
+                        gid, shape_code
+                    )
+                )
+                f.write("{:8d}       0       1       0\n".format(len(nodes)))
+                padded = list(nodes) + [0] * (10 - len(nodes))
+                f.write("".join("{:8d}".format(n) for n in padded) + "\n")
+        f.write(" 4       1       0       1\n")
+        f.write("property\n")
+        f.write("99       0       0       1\n")
+    return
+
+
+def _write_data(filename, name, data, order):
+    with open(filename, "w") as f:
+        f.write(name + "\n")
+        f.write("{} 1 {}\n".format(len(data), order))
+        f.write("header\n")
+        for gid, values in data.items():
+            f.write(" ".join(str(v) for v in [gid] + list(values)) + "\n")
+    return
+
+
+def _write_xml(filename, data_type, name, blocks, order):
+    with open(filename, "w") as f:
+        f.write('<?xml version="1.0"?>\n<Moldflow>\n<Dataset>\n')
+        f.write("<DataType>{}</DataType>\n".format(data_type))
+        f.write('<DeptVar Name="{}" Unit=""/>\n'.format(name))
+        f.write("<NumberOfComponents>{}</NumberOfComponents>\n".format(order))
+        f.write("<Blocks>\n")
+        for k, data in enumerate(blocks):
+            f.write('<Block Index="{}">\n'.format(k))
+            if len(blocks) > 1:
+                f.write(
+                    '<IndpVar Name="Time" Value="{}" Unit="s"/>\n'.format(k)
+                )
+            f.write("<Data>\n")
+            for gid, values in data.items():
+                f.write('<ElementData ID="{}"><DeptValues>'.format(gid))
+                f.write(" ".join(str(v) for v in values))
+                f.write("</DeptValues></ElementData>\n")
+            f.write("</Data>\n</Block>\n")
+        f.write("</Blocks>\n</Dataset>\n</Moldflow>\n")
+    return
+
+
+@pytest.fixture
+def pat_file(tmp_path):
+    filename = str(tmp_path / "test.pat")
+    _write_pat(filename, points, point_gids, cells)
+    return filename
+
+
+def _point_index(gid):
+    return point_gids.index(gid)
+
+
+def test_read_pat(pat_file):
+    mesh = meshio.patran_io.read(pat_file, scale=2.0, autoremove=False)
+
+    assert numpy.allclose(mesh.points, 2.0 * points)
+    assert set(mesh.cells.keys()) == set(cells.keys())
+    for key, (lnodes, _) in cells.items():
+        ref = numpy.vectorize(_point_index)(lnodes)
+        assert numpy.array_equal(mesh.cells[key], ref)
+    return
+
+
+@pytest.mark.parametrize("mode", ["r", "rb"])
+def test_read_pat_buffer(pat_file, mode):
+    with open(pat_file, mode) as f:
+        mesh, element_gids, gids = meshio.patran_io.read_pat_buffer(f, 1.0)
+
+    assert numpy.allclose(mesh.points, points)
+    assert numpy.array_equal(gids, point_gids)
+    assert numpy.array_equal(element_gids["triangle"], [3, 5])
+    return
+
+
+def test_read_pat_short_header(pat_file):
+    with open(pat_file) as f:
+        lines = f.readlines()
+    # Let the header of the first node card end right after the ID.
+    lines[2] = " 1      30\n"
+    with open(pat_file, "w") as f:
+        f.writelines(lines)
+
+    mesh = meshio.patran_io.read(pat_file, autoremove=False)
+
+    assert numpy.allclose(mesh.points, points)
+    return
+
+
+def test_read_pat_free_format_lnodes(pat_file):
+    with open(pat_file) as f:
+        lines = f.readlines()
+    # Write the node list of the quad separated by single blanks.
+    assert lines[20].startswith(" 2       7")
+    lines[22] = "30 10 20 50\n"
+    with open(pat_file, "w") as f:
+        f.writelines(lines)
+
+    mesh = meshio.patran_io.read(pat_file, autoremove=False)
+
+    assert numpy.array_equal(mesh.cells["quad"], [[0, 1, 2, 3]])
+    return
+
+
+@pytest.mark.parametrize("gid", [35, 70])
+def test_read_pat_undefined_node(pat_file, gid):
+    bad_cells = {"triangle": (numpy.array([[10, 40, gid]]), [3])}
+    _write_pat(pat_file, points, point_gids, bad_cells)
+
+    with pytest.raises(ValueError, match=str(gid)):
+        meshio.patran_io.read(pat_file, autoremove=False)
+    return
+
+
+def test_read_pat_higher_order(pat_file):
+    # A 10-node tetra shares the shape code of the linear tetra.
+    lnodes = numpy.array([point_gids + point_gids[:4]])
+    _write_pat(pat_file, points, point_gids, {"tetra": (lnodes, [9])})
+
+    mesh = meshio.patran_io.read(pat_file, autoremove=False)
+
+    assert list(mesh.cells) == ["tetra10"]
+    assert numpy.array_equal(
+        mesh.cells["tetra10"], [[0, 1, 2, 3, 4, 5, 0, 1, 2, 3]]
+    )
+    return
+
+
+def test_read_pat_node_count_mismatch(pat_file):
+    lnodes = numpy.array([point_gids[:5]])
+    _write_pat(pat_file, points, point_gids, {"tetra": (lnodes, [9])})
+
+    with pytest.raises(ValueError, match="has 5 nodes"):
+        meshio.patran_io.read(pat_file, autoremove=False)
+    return
+
+
+def test_read_ele(pat_file):
+    ele_file = pat_file.replace(".pat", ".ele")
+    _write_data(
+        ele_file, "fiber orientation", {7: [1.0, 2.0], 5: [3.0, 4.0]}, 2
+    )
+
+    mesh = meshio.patran_io.read(
+        pat_file, ele_filenames=[ele_file], autoremove=False
+    )
+
+    # Triangle 3 has no data attached.
+    assert numpy.allclose(
+        mesh.cell_data["quad"]["fiber_orientation"], [[1.0, 2.0]]
+    )
+    assert numpy.allclose(
+        mesh.cell_data["triangle"]["fiber_orientation"],
+        [[numpy.nan, numpy.nan], [3.0, 4.0]],
+        equal_nan=True,
+    )
+    return
+
+
+def test_read_ele_autoremove(pat_file):
+    triangles = {"triangle": cells["triangle"]}
+    _write_pat(pat_file, points, point_gids, triangles)
+    ele_file = pat_file.replace(".pat", ".ele")
+    _write_data(ele_file, "fiber orientation", {5: [3.0, 4.0]}, 2)
+
+    mesh = meshio.patran_io.read(pat_file, ele_filenames=[ele_file])
+
+    # Nodes 30 and 50 are orphaned, triangle 3 has no data attached.
+    assert numpy.allclose(mesh.points, points[[1, 2, 4, 5]])
+    assert numpy.array_equal(mesh.cells["triangle"], [[0, 3, 1]])
+    assert numpy.allclose(
+        mesh.cell_data["triangle"]["fiber_orientation"], [[3.0, 4.0]]
+    )
+    return
+
+
+def test_read_ele_empty(pat_file):
+    ele_file = pat_file.replace(".pat", ".ele")
+    _write_data(ele_file, "fiber orientation", {}, 2)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        mesh = meshio.patran_io.read(
+            pat_file, ele_filenames=[ele_file], autoremove=False
+        )
+
+    assert numpy.isnan(mesh.cell_data["quad"]["fiber_orientation"]).all()
+    return
+
+
+def test_read_ele_order_mismatch(pat_file):
+    ele_file = pat_file.replace(".pat", ".ele")
+    data = {7: [0.1, 0.2, 0.3], 5: [0.4, 0.5, 0.6]}
+    _write_data(ele_file, "fiber orientation", data, 1)
+
+    with pytest.raises(ValueError, match="header gives 1 components"):
+        meshio.patran_io.read(
+            pat_file, ele_filenames=[ele_file], autoremove=False
+        )
+    return
+
+
+def test_read_nod(pat_file):
+    nod_file = pat_file.replace(".pat", ".nod")
+    data = {gid: [float(gid)] for gid in point_gids[::-1]}
+    _write_data(nod_file, "temperature", data, 1)
+
+    mesh = meshio.patran_io.read(
+        pat_file, nod_filenames=[nod_file], autoremove=False
+    )
+
+    assert numpy.allclose(mesh.point_data["temperature"], point_gids)
+    return
+
+
+def test_read_xml(pat_file):
+    eldt_file = pat_file.replace(".pat", "_eldt.xml")
+    blocks = [{7: [1.0, 2.0], 3: [3.0, 4.0]}, {5: [5.0, 6.0]}]
+    _write_xml(eldt_file, "ELDT", "fiber orientation", blocks, 2)
+    nddt_file = pat_file.replace(".pat", "_nddt.xml")
+    data = {gid: [float(gid)] for gid in point_gids[1:]}
+    _write_xml(nddt_file, "NDDT", "temperature", [data], 1)
+
+    mesh = meshio.patran_io.read(
+        pat_file, xml_filenames=[eldt_file, nddt_file], autoremove=False
+    )
+
+    name0 = "fiber_orientation_Block:0_Time:0s"
+    name1 = "fiber_orientation_Block:1_Time:1s"
+    assert numpy.allclose(mesh.cell_data["quad"][name0], [[1.0, 2.0]])
+    assert numpy.allclose(
+        mesh.cell_data["triangle"][name0],
+        [[3.0, 4.0], [numpy.nan, numpy.nan]],
+        equal_nan=True,
+    )
+    assert numpy.allclose(
+        mesh.cell_data["quad"][name1], [[numpy.nan, numpy.nan]], equal_nan=True
+    )
+    assert numpy.allclose(
+        mesh.cell_data["triangle"][name1],
+        [[numpy.nan, numpy.nan], [5.0, 6.0]],
+        equal_nan=True,
+    )
+    assert numpy.allclose(
+        mesh.point_data["temperature"],
+        [numpy.nan] + point_gids[1:],
+        equal_nan=True,
+    )
+    return
+
+
+def test_read_xml_layers(pat_file):
+    xml_file = pat_file.replace(".pat", ".xml")
+    with open(xml_file, "w") as f:
+        f.write(
+            '<?xml version="1.0"?>\n<Moldflow>\n<Dataset>\n'
+            "<DataType>ELDT</DataType>\n"
+            '<DeptVar Name="thickness" Unit="mm"/>\n'
+            "<NumberOfComponents>1</NumberOfComponents>\n"
+            '<Blocks>\n<Block Index="0">\n'
+            '<Layer ID="1"><Data>'
+            '<ElementData ID="7"><DeptValues>1.0</DeptValues></ElementData>'
+            '<ElementData ID="3"><DeptValues>2.0</DeptValues></ElementData>'
+            "</Data></Layer>\n"
+            '<Layer ID="2"><Data>'
+            '<ElementData ID="7"><DeptValues>3.0</DeptValues></ElementData>'
+            "</Data></Layer>\n"
+            "</Block>\n</Blocks>\n</Dataset>\n</Moldflow>\n"
+        )
+
+    mesh = meshio.patran_io.read(
+        pat_file, xml_filenames=[xml_file], autoremove=False
+    )
+
+    # The last layer holding a value for an element wins.
+    assert numpy.allclose(mesh.cell_data["quad"]["thickness"], [[3.0]])
+    assert numpy.allclose(
+        mesh.cell_data["triangle"]["thickness"],
+        [[2.0], [numpy.nan]],
+        equal_nan=True,
+    )
+    return
+
+
+def test_read_pat_cached(pat_file):
+    mesh = meshio.patran_io.read(pat_file, autoremove=False)
+    mesh.points *= 2.0
+    mesh.cells["quad"][:] = 0
+
+    # Changing a mesh must not change the geometry shared between reads.
+    mesh = meshio.patran_io.read(pat_file, autoremove=False)
+    assert numpy.allclose(mesh.points, points)
+    assert numpy.array_equal(mesh.cells["quad"], [[0, 1, 2, 3]])
+
+    # A file replaced by another one is read again, even if the new file
+    # carries the old modification time.
+    stat = os.stat(pat_file)
+    new_file = pat_file + ".new"
+    _write_pat(new_file, points[::-1], point_gids, cells)
+    os.utime(new_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(new_file, pat_file)
+    mesh = meshio.patran_io.read(pat_file, autoremove=False)
+    assert numpy.allclose(mesh.points, points[::-1])
+
+    meshio.patran_io.clear_cache()
+    assert meshio.patran_io._read_pat_file.cache_info().currsize == 0
+    return